@@ -0,0 +1,162 @@
+import time
+import logging
+from collections import deque
+import numpy as np
+import rpyc
+
+# The arterial runs through roads 1 & 2 at every junction on the corridor.
+ARTERIAL_PAIR = (1, 2)
+CROSS_PAIR = (3, 4)
+
+
+class CorridorPlan:
+    """Fixed-time green-wave plan shared by every junction on the corridor.
+
+    Each cycle starts when the arterial turns GREEN. Junction i starts its
+    cycles offset(i) seconds after junction 0, so a platoon travelling at the
+    planned speed reaches every junction just as it turns green.
+    """
+    def __init__(self, cycle_length=60.0, arterial_green=30.0, travel_time=20.0, switch_duration=5.0):
+        if arterial_green + 2 * switch_duration >= cycle_length:
+            raise ValueError("Cycle is too short for the arterial green and two signal switches.")
+        self.cycle_length = cycle_length
+        self.arterial_green = arterial_green
+        self.travel_time = travel_time
+        self.switch_duration = switch_duration
+
+    def offset(self, index):
+        return (index * self.travel_time) % self.cycle_length
+
+
+class PeerLink:
+    """Keeps one controller's cycle aligned with its upstream neighbour.
+
+    The upstream peer is polled once per cycle with an NTP-style exchange,
+    which estimates the clock offset between the two processes and the
+    message delay. The sample with the lowest delay in a short window is
+    trusted, so a delayed reply cannot drag the estimate. The cycle is then
+    nudged towards the planned offset by a fraction of the error and by at
+    most max_step seconds per cycle, which keeps the corridor stable.
+    A controller without an upstream peer (junction 0) runs free.
+    """
+    def __init__(self, index, plan, upstream=None, clock_skew=0.0, gain=0.5, max_step=2.0):
+        self.index = index
+        self.plan = plan
+        self.offset = plan.offset(index)
+        self.upstream = upstream # (host, port) or None
+        self.clock_skew = clock_skew # Simulated skew, for testing on one machine
+        self.gain = gain
+        self.max_step = max_step
+
+        self.connection = None
+        self.samples = deque(maxlen=8) # (delay, clock_offset)
+        self.cycle_start = None # Local time at which the current cycle's arterial green starts
+        self.last_error = None
+
+    def clock(self):
+        """This controller's (possibly skewed) view of the current time."""
+        return time.time() + self.clock_skew
+
+    def status(self):
+        """(index, offset, cycle_start, last_error) for monitoring the corridor."""
+        return (self.index, self.offset, self.cycle_start, self.last_error)
+
+    # --- Upstream Exchange ---
+
+    def _sync(self):
+        """Polls the upstream peer. Returns its corridor epoch in local time, or None."""
+        try:
+            if self.connection is None:
+                host, port = self.upstream
+                self.connection = rpyc.connect(host, port, config={'allow_pickle': True, 'sync_request_timeout': 5})
+            t0 = self.clock()
+            t1, t2, peer_cycle_start, peer_offset = self.connection.root.corridor_sync()
+            t3 = self.clock()
+        except Exception as e:
+            logging.error(f"[CORRIDOR] Sync with upstream {self.upstream} failed: {e}")
+            self.connection = None
+            return None
+
+        self.samples.append(((t3 - t0) - (t2 - t1), ((t1 - t0) + (t2 - t3)) / 2))
+        if peer_cycle_start is None:
+            return None # Upstream has not scheduled its first cycle yet
+        delay, clock_offset = min(self.samples)
+        return peer_cycle_start - clock_offset - peer_offset
+
+    # --- Scheduling ---
+
+    def next_cycle_start(self):
+        """Schedules the next cycle and returns its start time on the local clock."""
+        cycle = self.plan.cycle_length
+        lead = self.plan.switch_duration + 1.0 # Time needed to switch into the arterial green
+        epoch = self._sync() if self.upstream else None
+        if self.cycle_start is None and self.upstream:
+            # Give the upstream peer up to one cycle to come up before running free.
+            deadline = self.clock() + cycle
+            while epoch is None and self.clock() < deadline:
+                time.sleep(1)
+                epoch = self._sync()
+        now = self.clock()
+
+        if self.cycle_start is None:
+            # First cycle: join the upstream wave directly, or start free-running.
+            base = now + lead if epoch is None else epoch + self.offset
+            self.cycle_start = base + max(0, np.ceil((now + lead - base) / cycle)) * cycle
+            logging.info(f"[CORRIDOR] Junction {self.index} starts its first cycle at {self.cycle_start:.3f}.")
+            return self.cycle_start
+
+        step = 0.0
+        if epoch is not None:
+            error = (epoch + self.offset - self.cycle_start + cycle / 2) % cycle - cycle / 2
+            step = float(np.clip(self.gain * error, -self.max_step, self.max_step))
+            self.last_error = error
+            logging.info(f"[CORRIDOR] Junction {self.index} offset error {error:+.3f}s, adjusting by {step:+.3f}s.")
+
+        next_start = self.cycle_start + cycle + step
+        while next_start < now + lead:
+            next_start += cycle # Overran a cycle (e.g. a VIP switch); skip ahead on the same plan
+        self.cycle_start = next_start
+        return self.cycle_start
+
+    def wait_until(self, local_time):
+        delay = local_time - self.clock()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def stops_per_vehicle(green_intervals, arrivals, travel_time, slack=1.0):
+    """Average number of stops for vehicles driving the corridor.
+
+    green_intervals holds one (n, 2) array of arterial [start, end) times per
+    junction, in corridor order. Vehicles reach junction 0 at the given
+    arrival times and take travel_time between junctions. A vehicle that
+    reaches a red light stops and leaves when it next turns green, unless the
+    light turns green within slack seconds, in which case it just slows down.
+    Vehicles that would still be waiting when the recorded timeline ends are
+    excluded.
+    """
+    t = np.asarray(arrivals, dtype=float)
+    stops = np.zeros(len(t))
+    valid = np.ones(len(t), dtype=bool)
+
+    for i, windows in enumerate(green_intervals):
+        windows = np.asarray(windows, dtype=float).reshape(-1, 2)
+        if i > 0:
+            t = t + travel_time
+        if len(windows) == 0:
+            return None
+        starts, ends = windows[:, 0], windows[:, 1]
+
+        k = np.searchsorted(starts, t + slack, side='right') - 1
+        in_green = (k >= 0) & (t < ends[np.maximum(k, 0)])
+        has_next = k + 1 < len(starts)
+
+        stopped = ~in_green
+        stops += stopped
+        valid &= in_green | has_next
+        t = np.where(in_green, np.maximum(t, starts[np.maximum(k, 0)]), t)
+        t = np.where(stopped & has_next, starts[np.minimum(k + 1, len(starts) - 1)], t)
+
+    if not valid.any():
+        return None
+    return float(stops[valid].mean())
@@ -0,0 +1,91 @@
+import rpyc
+import subprocess
+import tempfile
+import random
+import time
+import sys
+import os
+import shutil
+import argparse
+import numpy as np
+from rpyc.utils.classic import obtain
+from corridor import stops_per_vehicle
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signal_controller_server_full.py')
+
+
+def start_controllers(args, coordinated):
+    """Starts one headless controller process per junction, each in its own working directory."""
+    processes, workdirs = [], []
+    for i in range(args.junctions):
+        port = args.base_port + i
+        command = [sys.executable, SERVER_SCRIPT, '--headless', '--port', str(port),
+                   '--corridor-index', str(i), '--cycle', str(args.cycle),
+                   '--arterial-green', str(args.arterial_green), '--travel-time', str(args.travel_time),
+                   '--clock-skew', str(random.uniform(-args.max_skew, args.max_skew))]
+        if coordinated and i > 0:
+            command += ['--upstream', f"localhost:{port - 1}"]
+        elif not coordinated:
+            time.sleep(random.uniform(0, args.cycle)) # Random relative phases
+        workdir = tempfile.mkdtemp(prefix=f"junction_{i}_")
+        workdirs.append(workdir)
+        processes.append(subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    return processes, workdirs
+
+
+def measure(args, coordinated):
+    """Runs the corridor for args.duration seconds and returns the stops per vehicle."""
+    print(f"Running {args.junctions} {'coordinated' if coordinated else 'free-running'} junctions for {args.duration}s...")
+    processes, workdirs = start_controllers(args, coordinated)
+    try:
+        time.sleep(args.warmup)
+        start = time.time()
+        time.sleep(args.duration)
+        end = time.time()
+
+        intervals = []
+        for i in range(args.junctions):
+            connection = rpyc.connect('localhost', args.base_port + i, config={'allow_pickle': True})
+            intervals.append(np.array(obtain(connection.root.get_green_intervals(1, start, end))))
+            status = obtain(connection.root.get_corridor_status())
+            print(f"  Junction {i}: offset {status[1]:.1f}s, last offset error {status[3]}")
+            connection.close()
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        for workdir in workdirs:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # Vehicles arrive at the first junction uniformly over the part of the window
+    # that leaves time to drive the rest of the corridor.
+    last_arrival = end - (args.junctions - 1) * args.travel_time - args.cycle
+    arrivals = np.linspace(start, last_arrival, args.vehicles)
+    return stops_per_vehicle(intervals, arrivals, args.travel_time)
+
+
+def format_stops(stops):
+    """stops_per_vehicle returns None when no vehicle could be measured."""
+    return "n/a" if stops is None else f"{stops:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a green-wave corridor of local controllers and reports stops per vehicle.")
+    parser.add_argument('--junctions', type=int, default=4)
+    parser.add_argument('--base-port', type=int, default=18900)
+    parser.add_argument('--cycle', type=float, default=30.0)
+    parser.add_argument('--arterial-green', type=float, default=12.0)
+    parser.add_argument('--travel-time', type=float, default=8.0)
+    parser.add_argument('--max-skew', type=float, default=2.0, help="Maximum simulated clock skew per controller")
+    parser.add_argument('--warmup', type=float, default=60.0, help="Seconds to let the corridor settle before measuring")
+    parser.add_argument('--duration', type=float, default=120.0)
+    parser.add_argument('--vehicles', type=int, default=500)
+    args = parser.parse_args()
+
+    coordinated = measure(args, coordinated=True)
+    free_running = measure(args, coordinated=False)
+    print(f"Stops per vehicle: coordinated {format_stops(coordinated)}, free-running {format_stops(free_running)}")
+
+
+if __name__ == "__main__":
+    main()
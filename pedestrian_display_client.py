@@ -6,9 +6,14 @@ import time
 import sys
 import uuid
 from rpyc.utils.classic import obtain
+from tracing import Tracer, new_trace_id
+
+# Chrome Trace Event format; None disables tracing. Named by the display index
+# (third command-line argument) so restarts of the same display append to one file.
+TRACE_FILE = 'ped_display_{index}_trace.json'
 
 class PedestrianDisplay:
-    def __init__(self, server_host, server_port):
+    def __init__(self, server_host, server_port, display_index=1):
         self.client_id = f"ped_display_{uuid.uuid4().hex[:6]}"
         self.server_host = server_host
         self.server_port = server_port
@@ -16,6 +21,8 @@ class PedestrianDisplay:
         self.running = True
         self.connected = False
         self.ped_state = {'1_2': 0, '3_4': 0}
+        trace_file = TRACE_FILE.format(index=display_index) if TRACE_FILE else None
+        self.tracer = Tracer(trace_file, process_name=f"PedestrianDisplay {self.client_id}")
         self.root = tk.Tk()
         self.root.title(f"Pedestrian Display ({self.client_id})")
         self.root.geometry("400x300")
@@ -61,9 +68,13 @@ class PedestrianDisplay:
     def update_from_server(self):
         if self.running and self.connected:
             try:
-                state_data_proxy = self.connection.root.get_signal_state()
-                self.ped_state = obtain(state_data_proxy['pedestrian'])
-                self.update_display()
+                trace_id = new_trace_id()
+                with self.tracer.span("client.get_signal_state", trace_id):
+                    state_data_proxy = self.connection.root.get_signal_state(trace_id=trace_id)
+                with self.tracer.span("client.obtain", trace_id):
+                    self.ped_state = obtain(state_data_proxy['pedestrian'])
+                with self.tracer.span("client.render", trace_id):
+                    self.update_display()
             except Exception as e:
                 print(f"[{self.client_id}] Update error: {e}")
                 self.connected = False
@@ -86,6 +97,7 @@ class PedestrianDisplay:
         self.running = False
         if self.connection:
             self.connection.close()
+        self.tracer.close()
         self.root.destroy()
 
     def start(self):
@@ -97,5 +109,6 @@ class PedestrianDisplay:
 if __name__ == "__main__":
     server_host = sys.argv[1] if len(sys.argv) > 1 else 'localhost'
     server_port = int(sys.argv[2]) if len(sys.argv) > 2 else 18812
-    app = PedestrianDisplay(server_host, server_port)
+    display_index = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    app = PedestrianDisplay(server_host, server_port, display_index)
     app.start()
\ No newline at end of file
@@ -6,6 +6,9 @@ import threading
 import time
 from datetime import datetime
 from rpyc.utils.classic import obtain # ✅ IMPORT THIS
+from tracing import Tracer, new_trace_id
+
+TRACE_FILE = 'rto_client_trace.json' # Chrome Trace Event format; None disables tracing
 
 class RTOClient:
     def __init__(self, server_host, server_port):
@@ -25,6 +28,7 @@ class RTOClient:
         self.root.configure(bg='gray15')
         
         self.status_labels = {}
+        self.tracer = Tracer(TRACE_FILE, process_name="RTOClient")
         self.setup_gui()
 
     def setup_gui(self):
@@ -90,7 +94,9 @@ class RTOClient:
             messagebox.showwarning("Offline", "Cannot send command. Not connected to the server.")
             return
         try:
-            success = self.connection.root.force_signal_state(road_id)
+            trace_id = new_trace_id()
+            with self.tracer.span("client.force_signal_state", trace_id, road_id=road_id):
+                success = self.connection.root.force_signal_state(road_id, trace_id=trace_id)
             if success:
                 messagebox.showinfo("Command Sent", f"Request to force Road {road_id} green was sent successfully.")
             else:
@@ -104,19 +110,26 @@ class RTOClient:
         while self.running:
             if self.connected:
                 try:
-                    state_data_proxy = self.connection.root.get_signal_state()
+                    trace_id = new_trace_id()
+                    with self.tracer.span("client.get_signal_state", trace_id):
+                        state_data_proxy = self.connection.root.get_signal_state(trace_id=trace_id)
                     # ✅ THIS IS THE FIX: Convert the proxy to a real dict
-                    self.signals = obtain(state_data_proxy['signals'])
+                    with self.tracer.span("client.obtain", trace_id):
+                        self.signals = obtain(state_data_proxy['signals'])
                     
-                    self.root.after(0, self.update_display)
+                    self.root.after(0, self.update_display, trace_id)
                 except Exception as e:
                     print(f"Failed to get state: {e}")
                     self.connected = False
                     self.root.after(0, self.connection_status_label.config, {'text': '❌ DISCONNECTED', 'background': 'red'})
             time.sleep(1)
 
-    def update_display(self):
+    def update_display(self, trace_id=None):
         """Updates the GUI labels with the latest state data."""
+        with self.tracer.span("client.render", trace_id):
+            self._render_labels()
+
+    def _render_labels(self):
         state_map = {
             0: ("RED", "red"),
             0.5: ("RED", "maroon"),
@@ -133,6 +146,7 @@ class RTOClient:
         self.running = False
         if self.connection:
             self.connection.close()
+        self.tracer.close()
         self.root.destroy()
 
     def start(self):
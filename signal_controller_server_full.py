@@ -6,30 +6,47 @@ import random
 import logging
 from datetime import datetime
 import queue
+import argparse
+import os
+from contextlib import contextmanager
+from tracing import Tracer, SamplingProfiler, new_trace_id
+from signal_history import SignalHistory, QUEUED, PROCESSED, DROPPED, VIP
+from corridor import CorridorPlan, PeerLink, ARTERIAL_PAIR, CROSS_PAIR
 
 # --- Configuration ---
 HOST = '0.0.0.0' # Listen on all network interfaces
 PORT = 18812
+TRACE_FILE = 'traffic_controller_trace.json' # Chrome Trace Event format; None disables tracing
+PROFILE_FILE = 'traffic_controller_profile.folded' # Collapsed stacks from the sampling profiler
+HISTORY_DIR = 'signal_history' # Spilled signal timeline (.npz column files)
+HISTORY_SPILL_INTERVAL = 60 # Seconds between spills of the in-memory timeline
+LOG_FILE = 'traffic_controller.log'
+# The log, trace, profile and history above live in a per-controller data
+# directory: the working directory on the default port, controller_<port> otherwise.
 
 # --- Constants ---
 # Signal States
 RED, YELLOW, GREEN = 0, 1, 2
 # Pedestrian States
 PED_RED, PED_GREEN = 0, 1
+# Seconds a signal switch takes (YELLOW on the green pair, blinking red on the other)
+SWITCH_DURATION = 5
 
 # --- Logging Setup ---
+LOG_FORMAT = '%(asctime)s [%(levelname)s] (%(threadName)s) %(message)s'
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] (%(threadName)s) %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler("traffic_controller.log"),
+        logging.FileHandler(LOG_FILE, delay=True), # Opened on first use, after --data-dir is applied
         logging.StreamHandler()
     ]
 )
 
 class TrafficControllerService(rpyc.Service):
-    def __init__(self):
+    def __init__(self, required_clients=None, peer_link=None, data_dir='.'):
         super().__init__()
+        self.data_dir = data_dir
         # This lock protects shared state. For full Task 5, a more complex
         # ReadWriteLock would be ideal, but a standard Lock is sufficient here.
         self.state_lock = threading.Lock()
@@ -44,7 +61,7 @@ class TrafficControllerService(rpyc.Service):
         self.clients = {}
         # This setup is for Version 1 (Tasks 1-4).
         # You can adjust this for Version 2 (RTOs) if needed.
-        self.required_clients = {'traffic_display': 1, 'pedestrian_display': 2}
+        self.required_clients = {'traffic_display': 1, 'pedestrian_display': 2} if required_clients is None else required_clients
         self.all_clients_connected = False
         self.active_clients = 0 # Simple counter
         
@@ -55,6 +72,22 @@ class TrafficControllerService(rpyc.Service):
         # Task 3: VIP Deadlock Management
         self.vip_queue = queue.PriorityQueue() # (priority, road_id, timestamp)
         
+        # --- Tracing & Profiling ---
+        self.tracer = Tracer(os.path.join(data_dir, TRACE_FILE) if TRACE_FILE else None,
+                             process_name="TrafficController")
+        self.profiler = SamplingProfiler()
+        
+        # --- Signal Timeline ---
+        self.history = SignalHistory(os.path.join(data_dir, HISTORY_DIR), spill_interval=HISTORY_SPILL_INTERVAL)
+        self.started_at = time.time()
+        self.history.start()
+        for road_id, state in self.traffic_signals.items():
+            self.history.record_transition(road_id, state)
+        
+        # --- Corridor Coordination ---
+        # When set, the fixed-time green-wave plan replaces request-driven switching.
+        self.peer_link = peer_link
+        
         logging.info("Traffic Controller Service initialized.")
         
     def on_connect(self, conn):
@@ -64,6 +97,8 @@ class TrafficControllerService(rpyc.Service):
     def on_disconnect(self, conn):
         logging.warning(f"A client has disconnected: {conn}. Operations may be halted.")
         self.active_clients -= 1
+        if sum(self.required_clients.values()) == 0:
+            return # Headless: operations never wait on clients
         self.all_clients_connected = False
         self.clients.clear() # Clear registered clients to force re-registration
         logging.error("A client disconnected. Halting operations and waiting for all clients to reconnect.")
@@ -78,7 +113,8 @@ class TrafficControllerService(rpyc.Service):
                 self.all_clients_connected = True
                 logging.info("All required clients have connected. Starting operations.")
                 # Start the main control loop and other handlers
-                threading.Thread(target=self._main_control_loop, name="ControlLoop", daemon=True).start()
+                control_loop = self._corridor_control_loop if self.peer_link else self._main_control_loop
+                threading.Thread(target=control_loop, name="ControlLoop", daemon=True).start()
                 threading.Thread(target=self._simulate_traffic_requests, name="RequestSim", daemon=True).start()
                 threading.Thread(target=self._vip_request_handler, name="VIPHandler", daemon=True).start()
         else:
@@ -95,24 +131,30 @@ class TrafficControllerService(rpyc.Service):
         logging.info(f"Registered client: ID='{client_id}', Type='{client_type}'")
         self._check_start_condition()
 
-    def exposed_get_signal_state(self):
+    def exposed_get_signal_state(self, trace_id=None):
         """[Task 5: READ] Provides the current state of all signals."""
-        with self.state_lock:
-            return {
-                'signals': self.traffic_signals.copy(),
-                'pedestrian': self.pedestrian_signals.copy()
-            }
+        trace_id = trace_id or new_trace_id()
+        with self.tracer.span("get_signal_state", trace_id):
+            with self._locked(trace_id):
+                return {
+                    'signals': self.traffic_signals.copy(),
+                    'pedestrian': self.pedestrian_signals.copy()
+                }
             
-    def exposed_request_green(self, road_id):
+    def exposed_request_green(self, road_id, trace_id=None):
         """[Task 2 & 4] External method for a road to request green light."""
-        if self.request_queue.full():
-            logging.error(f"Request queue is full! SERVER OVERLOADED. Dropping request from Road {road_id}.")
-            return False # Reject request
-        
-        request = (road_id, time.time())
-        self.request_queue.put(request)
-        logging.info(f"[MUTEX] Road {road_id} requested green. Added to queue. Queue size: {self.request_queue.qsize()}")
-        return True
+        trace_id = trace_id or new_trace_id()
+        with self.tracer.span("request_green", trace_id, road_id=road_id):
+            if self.request_queue.full():
+                logging.error(f"Request queue is full! SERVER OVERLOADED. Dropping request from Road {road_id}.")
+                self.history.record_request(road_id, DROPPED, queue_depth=self.request_queue.qsize())
+                return False # Reject request
+            
+            request = (road_id, time.time(), trace_id)
+            self.request_queue.put(request)
+            self.history.record_request(road_id, QUEUED, queue_depth=self.request_queue.qsize())
+            logging.info(f"[MUTEX] Road {road_id} requested green. Added to queue. Queue size: {self.request_queue.qsize()} (trace {trace_id})")
+            return True
 
     def exposed_vip_request(self, road_id, distance):
         """[Task 3] Method for VIP vehicles to request passage."""
@@ -120,26 +162,74 @@ class TrafficControllerService(rpyc.Service):
         self.vip_queue.put((priority, road_id, time.time()))
         logging.warning(f"[DEADLOCK MGMT] VIP request from Road {road_id} at distance {distance}. Added to priority queue.")
 
-    def exposed_force_signal_state(self, road_id):
+    def exposed_force_signal_state(self, road_id, trace_id=None):
         """[Task 5: WRITE] Allows an RTO to force a signal switch."""
-        logging.warning(f"[RTO OVERRIDE] Received request to force Road {road_id} green.")
+        trace_id = trace_id or new_trace_id()
+        logging.warning(f"[RTO OVERRIDE] Received request to force Road {road_id} green. (trace {trace_id})")
         
-        # Check if a switch is already happening to prevent conflicts.
-        with self.state_lock:
-            if self.is_switching:
-                logging.error("Cannot process RTO request: a switch is already in progress.")
-                return False
+        with self.tracer.span("force_signal_state", trace_id, road_id=road_id):
+            # Check if a switch is already happening to prevent conflicts.
+            with self._locked(trace_id):
+                if self.is_switching:
+                    logging.error("Cannot process RTO request: a switch is already in progress.")
+                    return False
 
-            current_green_pair, _ = self._get_pairs()
-            if road_id in current_green_pair:
-                logging.info(f"RTO request for Road {road_id} is for an already green light. No action needed.")
-                return True
+                current_green_pair, _ = self._get_pairs()
+                if road_id in current_green_pair:
+                    logging.info(f"RTO request for Road {road_id} is for an already green light. No action needed.")
+                    return True
+            
+            # Since the target road is not green, initiate a switch.
+            # Run in a new thread to avoid blocking the RTO client.
+            logging.info(f"RTO override is triggering a signal switch for Road {road_id}.")
+            threading.Thread(target=self._switch_signals, args=(trace_id,), daemon=True).start()
+            return True
+
+    def exposed_set_profiling(self, enabled):
+        """[Admin] Starts or stops the sampling profiler on the live controller.
         
-        # Since the target road is not green, initiate a switch.
-        # Run in a new thread to avoid blocking the RTO client.
-        logging.info(f"RTO override is triggering a signal switch for Road {road_id}.")
-        threading.Thread(target=self._switch_signals, daemon=True).start()
-        return True
+        Starting returns False if the profiler is already running. Stopping writes
+        the collapsed stacks to PROFILE_FILE in the data directory and returns the
+        number of samples taken.
+        """
+        if enabled:
+            return self.profiler.start()
+        return self.profiler.stop(os.path.join(self.data_dir, PROFILE_FILE))
+
+    def exposed_corridor_sync(self):
+        """[Corridor] Returns receive/send timestamps and this junction's phase to a downstream peer."""
+        if self.peer_link is None:
+            raise ValueError("Corridor mode is not enabled on this controller.")
+        received = self.peer_link.clock()
+        return (received, self.peer_link.clock(), self.peer_link.cycle_start, self.peer_link.offset)
+
+    def exposed_get_corridor_status(self):
+        """[Corridor] Returns (index, offset, cycle_start, last_error), or None outside corridor mode."""
+        return self.peer_link.status() if self.peer_link else None
+
+    # --- Timeline Queries ---
+    # Windows are Unix timestamps; start defaults to when this controller
+    # started and end to now. Pass an earlier start to include spilled history.
+
+    def exposed_get_green_share(self, start=None, end=None):
+        """Fraction of the window each road spent GREEN."""
+        return self.history.green_share(*self._window(start, end))
+
+    def exposed_get_wait_percentiles(self, start=None, end=None, percentiles=(50, 90, 99)):
+        """Percentiles of the time processed requests spent waiting in the queue."""
+        return self.history.wait_percentiles(*self._window(start, end), percentiles=tuple(percentiles))
+
+    def exposed_get_switch_counts(self, start=None, end=None):
+        """Number of times each road turned GREEN within the window."""
+        return self.history.switch_counts(*self._window(start, end))
+
+    def exposed_get_blink_stats(self, start=None, end=None):
+        """Blink pulses and seconds spent in the "off" state per road."""
+        return self.history.blink_stats(*self._window(start, end))
+
+    def exposed_get_green_intervals(self, road_id, start=None, end=None):
+        """List of (start, end) times the road was GREEN within the window."""
+        return [tuple(row) for row in self.history.green_intervals(road_id, *self._window(start, end)).tolist()]
 
     # --- Core Logic ---
     
@@ -158,7 +248,10 @@ class TrafficControllerService(rpyc.Service):
                 continue
                 
             if not self.request_queue.empty():
-                road_id, req_time = self.request_queue.get()
+                road_id, req_time, trace_id = self.request_queue.get()
+                self.tracer.record("request_queue_wait", req_time, time.time(), trace_id, road_id=road_id)
+                self.history.record_request(road_id, PROCESSED, wait=time.time() - req_time,
+                                            queue_depth=self.request_queue.qsize())
                 logging.info(f"[MUTEX] Processing request for Road {road_id}. Granting access.")
                 
                 current_green_pair, _ = self._get_pairs()
@@ -166,15 +259,63 @@ class TrafficControllerService(rpyc.Service):
                     logging.info(f"Request from Road {road_id} is for an already green light. Ignoring.")
                     continue
                 
-                self._switch_signals()
+                self._switch_signals(trace_id)
             
             time.sleep(0.5)
 
+    def _corridor_control_loop(self):
+        """[Corridor] Runs the green-wave plan, keeping each cycle aligned with the upstream peer."""
+        link, plan = self.peer_link, self.peer_link.plan
+        green_pair, _ = self._get_pairs()
+        self._set_green(green_pair)
+        
+        while True:
+            if not self.all_clients_connected:
+                time.sleep(1)
+                continue
+            
+            cycle_start = link.next_cycle_start()
+            link.wait_until(cycle_start - plan.switch_duration)
+            self._serve_pair(ARTERIAL_PAIR)
+            link.wait_until(cycle_start + plan.arterial_green)
+            self._serve_pair(CROSS_PAIR)
+            
+            # Green requests are served by the fixed plan rather than by extra switches.
+            while not self.request_queue.empty():
+                road_id, req_time, trace_id = self.request_queue.get()
+                self.history.record_request(road_id, PROCESSED, wait=time.time() - req_time,
+                                            queue_depth=self.request_queue.qsize())
+
+    def _serve_pair(self, road_pair):
+        """Switches signals unless road_pair is already the green pair.
+        
+        If another switch (e.g. an RTO override or a VIP) is in progress, waits
+        for it to finish and checks the green pair again, so a planned phase is
+        never skipped silently.
+        """
+        requested = time.time()
+        switched = False
+        while True:
+            current_green_pair, _ = self._get_pairs()
+            if current_green_pair == road_pair:
+                break
+            switched = self._switch_signals()
+            if switched:
+                break
+            time.sleep(0.1) # Another switch is running
+        
+        overrun = time.time() - requested - (SWITCH_DURATION if switched else 0)
+        if overrun > 0.5:
+            logging.warning(f"[CORRIDOR] Phase for Roads {road_pair} started {overrun:.1f}s late: "
+                            "waited for another signal switch to finish.")
+
     def _vip_request_handler(self):
         """[Task 3] Handles VIP requests, resolving potential deadlocks."""
         while True:
             if self.all_clients_connected and not self.vip_queue.empty():
                 priority, road_id, req_time = self.vip_queue.get()
+                self.history.record_request(road_id, VIP, wait=time.time() - req_time,
+                                            queue_depth=self.vip_queue.qsize())
                 logging.warning(f"[DEADLOCK MGMT] Handling VIP request for Road {road_id}.")
                 
                 current_green_pair, _ = self._get_pairs()
@@ -187,40 +328,48 @@ class TrafficControllerService(rpyc.Service):
             
             time.sleep(1)
             
-    def _switch_signals(self):
+    def _switch_signals(self, trace_id=None):
         """Manages the 5-second transition period between signal pairs."""
-        with self.state_lock:
+        trace_id = trace_id or new_trace_id()
+        with self._locked(trace_id):
             if self.is_switching:
-                return # Avoid concurrent switches
+                return False # Avoid concurrent switches
             self.is_switching = True
 
-        logging.info("Starting signal switch...")
+        with self.tracer.span("switch_signals", trace_id):
+            self._run_switch(trace_id)
+        return True
+
+    def _run_switch(self, trace_id):
+        """Runs the YELLOW, blinking-red and commit phases of a switch, tracing each one."""
+        logging.info(f"Starting signal switch... (trace {trace_id})")
         
         green_pair, red_pair = self._get_pairs()
         
-        with self.state_lock:
-            self.traffic_signals[green_pair[0]] = YELLOW
-            self.traffic_signals[green_pair[1]] = YELLOW
+        with self.tracer.span("switch.yellow", trace_id), self._locked(trace_id):
+            self._set_signal(green_pair[0], YELLOW)
+            self._set_signal(green_pair[1], YELLOW)
             logging.info(f"Roads {green_pair} set to YELLOW.")
             
-        blinker_thread = threading.Thread(target=self._blink_red, args=(red_pair, 5), daemon=True)
-        blinker_thread.start()
-        
-        time.sleep(5)
-        blinker_thread.join()
+        with self.tracer.span("switch.blink", trace_id):
+            blinker_thread = threading.Thread(target=self._blink_red, args=(red_pair, SWITCH_DURATION), daemon=True)
+            blinker_thread.start()
+            
+            time.sleep(SWITCH_DURATION)
+            blinker_thread.join()
         
-        with self.state_lock:
+        with self.tracer.span("switch.commit", trace_id), self._locked(trace_id):
             self.active_pair = red_pair
             
-            self.traffic_signals[green_pair[0]] = RED
-            self.traffic_signals[green_pair[1]] = RED
+            self._set_signal(green_pair[0], RED)
+            self._set_signal(green_pair[1], RED)
             if green_pair == (1, 2):
                 self.pedestrian_signals['1_2'] = PED_GREEN
             else:
                 self.pedestrian_signals['3_4'] = PED_GREEN
 
-            self.traffic_signals[red_pair[0]] = GREEN
-            self.traffic_signals[red_pair[1]] = GREEN
+            self._set_signal(red_pair[0], GREEN)
+            self._set_signal(red_pair[1], GREEN)
             if red_pair == (1, 2):
                 self.pedestrian_signals['1_2'] = PED_RED
             else:
@@ -236,13 +385,39 @@ class TrafficControllerService(rpyc.Service):
         while time.time() < end_time:
             with self.state_lock:
                 state = RED if is_red else 0.5 # Using 0.5 for "off" state
-                self.traffic_signals[road_pair[0]] = state
-                self.traffic_signals[road_pair[1]] = state
+                self._set_signal(road_pair[0], state)
+                self._set_signal(road_pair[1], state)
             is_red = not is_red
             time.sleep(0.5)
         with self.state_lock:
-            self.traffic_signals[road_pair[0]] = RED
-            self.traffic_signals[road_pair[1]] = RED
+            self._set_signal(road_pair[0], RED)
+            self._set_signal(road_pair[1], RED)
+
+    @contextmanager
+    def _locked(self, trace_id=None):
+        """Acquires state_lock, recording the time spent waiting for it.
+        
+        The span is written after the lock is released so tracing I/O never
+        runs inside the critical section it measures.
+        """
+        requested = time.time()
+        self.state_lock.acquire()
+        acquired = time.time()
+        try:
+            yield
+        finally:
+            self.state_lock.release()
+            self.tracer.record("state_lock_wait", requested, acquired, trace_id)
+
+    def _set_signal(self, road_id, state):
+        """Sets a road's signal and records the transition. Caller must hold state_lock."""
+        if self.traffic_signals[road_id] != state:
+            self.traffic_signals[road_id] = state
+            self.history.record_transition(road_id, state)
+
+    def _window(self, start, end):
+        """Fills in the defaults for a timeline query window."""
+        return (self.started_at if start is None else float(start)), (time.time() if end is None else float(end))
 
     def _set_green(self, road_pair):
         """Helper to set a pair of roads to green and others to red."""
@@ -250,8 +425,8 @@ class TrafficControllerService(rpyc.Service):
             all_roads = {1, 2, 3, 4}
             red_roads = all_roads - set(road_pair)
             
-            for r in road_pair: self.traffic_signals[r] = GREEN
-            for r in red_roads: self.traffic_signals[r] = RED
+            for r in road_pair: self._set_signal(r, GREEN)
+            for r in red_roads: self._set_signal(r, RED)
 
             if road_pair == (1, 2):
                 self.pedestrian_signals['1_2'] = PED_RED
@@ -275,7 +450,9 @@ class TrafficControllerService(rpyc.Service):
                 road_to_request = random.randint(1, 4)
                 self.exposed_request_green(road_to_request)
                 
-                if random.random() < 0.1: # 10% chance for a VIP
+                # 10% chance for a VIP. Simulated VIPs are off in corridor mode, where
+                # they would break up the green wave; real VIP requests still preempt it.
+                if not self.peer_link and random.random() < 0.1:
                     vip_road = random.randint(1,4)
                     vip_dist = random.randint(10, 100)
                     self.exposed_vip_request(vip_road, vip_dist)
@@ -284,14 +461,64 @@ class TrafficControllerService(rpyc.Service):
 
 
 if __name__ == "__main__":
-    logging.info(f"Starting Traffic Controller Server on {HOST}:{PORT}")
+    parser = argparse.ArgumentParser(description="Traffic Signal Controller")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--data-dir',
+                        help="Directory for the log, trace, profile and signal history "
+                             "(default: current directory on the default port, controller_<port> otherwise)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Start operations without waiting for display clients")
+    parser.add_argument('--corridor-index', type=int,
+                        help="Position of this junction on a green-wave corridor (0 = first); requires --headless")
+    parser.add_argument('--upstream', help="host:port of the upstream controller on the corridor")
+    parser.add_argument('--cycle', type=float, default=60.0, help="Corridor cycle length in seconds")
+    parser.add_argument('--arterial-green', type=float, default=30.0, help="Arterial green time per cycle")
+    parser.add_argument('--travel-time', type=float, default=20.0, help="Travel time between junctions")
+    parser.add_argument('--clock-skew', type=float, default=0.0,
+                        help="Simulated clock skew in seconds, for testing peers on one machine")
+    args = parser.parse_args()
+    if args.corridor_index is not None and not args.headless:
+        # Peer and analytics connections would otherwise count as display clients,
+        # and any of them disconnecting would halt the corridor cycle.
+        parser.error("--corridor-index requires --headless")
+
+    # Controllers on other ports get their own data directory, so several of them
+    # started from one directory never share (and rewrite) each other's history.
+    data_dir = args.data_dir or ('.' if args.port == PORT else f"controller_{args.port}")
+    os.makedirs(data_dir, exist_ok=True)
+    if os.path.abspath(data_dir) != os.path.abspath('.'):
+        root_logger = logging.getLogger()
+        for handler in [h for h in root_logger.handlers if isinstance(h, logging.FileHandler)]:
+            root_logger.removeHandler(handler)
+            handler.close()
+        file_handler = logging.FileHandler(os.path.join(data_dir, LOG_FILE))
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root_logger.addHandler(file_handler)
+
+    peer_link = None
+    if args.corridor_index is not None:
+        plan = CorridorPlan(args.cycle, args.arterial_green, args.travel_time, SWITCH_DURATION)
+        upstream = None
+        if args.upstream:
+            host, port = args.upstream.rsplit(':', 1)
+            upstream = (host, int(port))
+        peer_link = PeerLink(args.corridor_index, plan, upstream, clock_skew=args.clock_skew)
+        logging.info(f"Corridor mode: junction {args.corridor_index}, offset {peer_link.offset}s, upstream {upstream}.")
+
+    logging.info(f"Starting Traffic Controller Server on {HOST}:{args.port} (data directory: {data_dir})")
+    service = TrafficControllerService(required_clients={} if args.headless else None, peer_link=peer_link,
+                                       data_dir=data_dir)
+    if args.headless:
+        service._check_start_condition()
     server = ThreadedServer(
-        TrafficControllerService(),
-        port=PORT,
+        service,
+        port=args.port,
         protocol_config={"allow_pickle": True}
     )
     try:
         server.start()
     except KeyboardInterrupt:
         logging.info("Server shutting down.")
-        server.close()
\ No newline at end of file
+        server.close()
+        service.tracer.close()
+        service.history.spill()
\ No newline at end of file
@@ -0,0 +1,229 @@
+import os
+import glob
+import time
+import threading
+import logging
+import numpy as np
+
+# --- Event Layouts ---
+# A signal state transition: road_id changed to state at ts.
+TRANSITION_DTYPE = np.dtype([('ts', 'f8'), ('road', 'i1'), ('state', 'f4')])
+# A green-light request event. wait is only meaningful for PROCESSED and VIP.
+REQUEST_DTYPE = np.dtype([('ts', 'f8'), ('road', 'i1'), ('kind', 'i1'), ('wait', 'f4'), ('queue_depth', 'i2')])
+
+# Request event kinds
+QUEUED, PROCESSED, DROPPED, VIP = 0, 1, 2, 3
+
+# Signal state values as stored in traffic_signals (0.5 is the blinking "off" state)
+RED, OFF, YELLOW, GREEN = 0.0, 0.5, 1.0, 2.0
+STATE_CODES = np.array([RED, OFF, YELLOW, GREEN], dtype='f4')
+NUM_ROADS = 4
+
+
+class EventRing:
+    """Fixed-capacity, array-backed ring buffer of structured events.
+
+    Rows are written at count % capacity. Rows that have not been spilled to
+    disk yet are never overwritten; the owner must spill before pending()
+    reaches capacity.
+    """
+    def __init__(self, dtype, capacity):
+        self.rows = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.count = 0
+        self.spilled = 0
+        self.lock = threading.Lock()
+
+    def append(self, row):
+        with self.lock:
+            self.rows[self.count % self.capacity] = row
+            self.count += 1
+
+    def pending(self):
+        return self.count - self.spilled
+
+    def unspilled(self):
+        """Returns a copy of the rows not yet spilled, oldest first."""
+        with self.lock:
+            index = np.arange(self.spilled, self.count) % self.capacity
+            return self.rows[index]
+
+    def mark_spilled(self, n):
+        with self.lock:
+            self.spilled += n
+
+
+class SignalHistory:
+    """Timeline of signal transitions and request events with NumPy analytics.
+
+    Events are buffered in memory and periodically spilled to compressed
+    columnar .npz files (one array per field). Each file holds one kind of
+    event for one file_span-second bucket (an hour by default) and is named
+    by the bucket's start, so window queries only load the files that overlap
+    the window. Spills append to the current bucket's file, which keeps the
+    file count at one per kind per hour however often events are spilled.
+    """
+    def __init__(self, directory, capacity=65536, spill_interval=60, file_span=3600):
+        self.directory = directory
+        self.spill_interval = spill_interval
+        self.file_span = file_span
+        self.transitions = EventRing(TRANSITION_DTYPE, capacity)
+        self.requests = EventRing(REQUEST_DTYPE, capacity)
+        self.append_lock = threading.Lock()
+        self.io_lock = threading.Lock() # Serializes spilling against queries
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        threading.Thread(target=self._spill_loop, name="HistorySpill", daemon=True).start()
+
+    # --- Recording ---
+
+    def record_transition(self, road_id, state, ts=None):
+        self._append(self.transitions, (time.time() if ts is None else ts, road_id, state))
+
+    def record_request(self, road_id, kind, wait=0.0, queue_depth=0, ts=None):
+        self._append(self.requests, (time.time() if ts is None else ts, road_id, kind, wait, queue_depth))
+
+    def _append(self, ring, row):
+        with self.append_lock:
+            if ring.pending() >= ring.capacity:
+                self.spill() # Never overwrite rows that only exist in memory
+            ring.append(row)
+
+    # --- Persistence ---
+
+    def spill(self):
+        """Appends all buffered events to their bucket files on disk."""
+        with self.io_lock:
+            for kind, ring in (('transitions', self.transitions), ('requests', self.requests)):
+                rows = ring.unspilled()
+                if len(rows) == 0:
+                    continue
+                buckets = (rows['ts'] // self.file_span).astype(np.int64) * self.file_span
+                for bucket in np.unique(buckets):
+                    path = self._path(kind, bucket)
+                    chunk = rows[buckets == bucket]
+                    if os.path.exists(path):
+                        chunk = np.concatenate((self._read(path, chunk.dtype), chunk))
+                    # Write a temporary file first so a crash never leaves a truncated bucket.
+                    with open(path + '.tmp', 'wb') as f:
+                        np.savez_compressed(f, **{field: chunk[field] for field in chunk.dtype.names})
+                    os.replace(path + '.tmp', path)
+                ring.mark_spilled(len(rows))
+                logging.info(f"[HISTORY] Spilled {len(rows)} {kind} events into {len(np.unique(buckets))} file(s).")
+
+    def _path(self, kind, bucket):
+        return os.path.join(self.directory, f"{kind}_{int(bucket)}.npz")
+
+    def _spill_loop(self):
+        while True:
+            time.sleep(self.spill_interval)
+            try:
+                self.spill()
+            except Exception as e:
+                logging.error(f"[HISTORY] Failed to spill events: {e}")
+
+    def _read(self, path, dtype):
+        """Reads one spilled column file back into a structured array."""
+        with np.load(path) as data:
+            chunk = np.empty(len(data['ts']), dtype=dtype)
+            for field in chunk.dtype.names:
+                chunk[field] = data[field]
+        return chunk
+
+    def _load(self, kind, ring, start, end, include_previous=False):
+        """Loads events with start <= ts <= end from disk and memory, sorted by ts.
+
+        With include_previous, earlier files are walked back until every road's
+        last event before the window is known, so the state in force at the
+        start of the window is available.
+        """
+        with self.io_lock:
+            files = []
+            for path in glob.glob(os.path.join(self.directory, f"{kind}_*.npz")):
+                first = int(os.path.basename(path)[:-4].split('_')[1])
+                files.append((first, first + self.file_span, path))
+            files.sort()
+
+            selected = [path for first, last, path in files if last > start and first <= end]
+            chunks = [self._read(path, ring.rows.dtype) for path in selected]
+            chunks.append(ring.unspilled())
+
+            if include_previous:
+                seen = set()
+                for chunk in chunks:
+                    seen.update(np.unique(chunk['road'][chunk['ts'] < start]).tolist())
+                for first, last, path in reversed([f for f in files if f[1] <= start]):
+                    if len(seen) >= NUM_ROADS:
+                        break
+                    chunk = self._read(path, ring.rows.dtype)
+                    seen.update(np.unique(chunk['road']).tolist())
+                    chunks.append(chunk)
+
+        events = np.concatenate(chunks)
+        events = events[events['ts'] <= end]
+        if not include_previous:
+            events = events[events['ts'] >= start]
+        return events[np.argsort(events['ts'], kind='stable')]
+
+    # --- Queries ---
+
+    def state_durations(self, start, end):
+        """Returns a (NUM_ROADS + 1, len(STATE_CODES)) matrix of seconds spent in each state.
+
+        Row index is the road id (row 0 is unused), column index follows STATE_CODES.
+        """
+        t = self._load('transitions', self.transitions, start, end, include_previous=True)
+        durations = np.zeros((NUM_ROADS + 1, len(STATE_CODES)))
+        if len(t) == 0:
+            return durations
+
+        t = t[np.lexsort((t['ts'], t['road']))]
+        begins = np.clip(t['ts'], start, end)
+        ends = np.empty_like(begins)
+        ends[:-1] = begins[1:]
+        last_of_road = np.append(t['road'][1:] != t['road'][:-1], True)
+        ends[last_of_road] = end
+
+        state_index = np.searchsorted(STATE_CODES, t['state'])
+        np.add.at(durations, (t['road'], state_index), ends - begins)
+        return durations
+
+    def green_intervals(self, road_id, start, end):
+        """Returns an (n, 2) array of [start, end) times the road was GREEN within the window."""
+        t = self._load('transitions', self.transitions, start, end, include_previous=True)
+        t = t[t['road'] == road_id]
+        begins = np.clip(t['ts'], start, end)
+        ends = np.append(begins[1:], end)
+        green = (t['state'] == GREEN) & (ends > begins)
+        return np.column_stack((begins[green], ends[green]))
+
+    def green_share(self, start, end):
+        """Fraction of the window each road spent GREEN."""
+        green = self.state_durations(start, end)[:, STATE_CODES.searchsorted(GREEN)]
+        window = max(end - start, 1e-9)
+        return {road: float(green[road] / window) for road in range(1, NUM_ROADS + 1)}
+
+    def switch_counts(self, start, end):
+        """Number of times each road turned GREEN within the window."""
+        t = self._load('transitions', self.transitions, start, end)
+        counts = np.bincount(t['road'][t['state'] == GREEN], minlength=NUM_ROADS + 1)
+        return {road: int(counts[road]) for road in range(1, NUM_ROADS + 1)}
+
+    def blink_stats(self, start, end):
+        """Per road, the number of blink pulses and total seconds spent in the "off" state."""
+        t = self._load('transitions', self.transitions, start, end)
+        pulses = np.bincount(t['road'][t['state'] == OFF], minlength=NUM_ROADS + 1)
+        off = self.state_durations(start, end)[:, STATE_CODES.searchsorted(OFF)]
+        return {road: {'pulses': int(pulses[road]), 'off_seconds': float(off[road])}
+                for road in range(1, NUM_ROADS + 1)}
+
+    def wait_percentiles(self, start, end, percentiles=(50, 90, 99), kind=PROCESSED):
+        """Wait-time percentiles (seconds) of requests of the given kind within the window."""
+        r = self._load('requests', self.requests, start, end)
+        waits = r['wait'][r['kind'] == kind]
+        result = {'count': int(len(waits))}
+        values = np.percentile(waits, percentiles) if len(waits) else [None] * len(percentiles)
+        for p, value in zip(percentiles, values):
+            result[f"p{p}"] = None if value is None else float(value)
+        return result
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from corridor import CorridorPlan, PeerLink, stops_per_vehicle
+
+GREENS = np.array([[0, 10], [30, 40], [60, 70]], dtype=float)
+
+
+@pytest.fixture
+def plan():
+    return CorridorPlan(cycle_length=30.0, arterial_green=12.0, travel_time=8.0, switch_duration=5.0)
+
+
+def make_link(plan, now, epoch, cycle_start=1000.0, upstream=('localhost', 1)):
+    link = PeerLink(1, plan, upstream=upstream)
+    link.cycle_start = cycle_start
+    link.clock = lambda: now
+    link._sync = lambda: epoch
+    return link
+
+
+def test_plan_rejects_cycle_without_room_for_switches():
+    with pytest.raises(ValueError):
+        CorridorPlan(cycle_length=20.0, arterial_green=12.0, switch_duration=5.0)
+
+
+def test_vehicle_in_green_wave_never_stops():
+    assert stops_per_vehicle([GREENS, GREENS + 5], [5.0], travel_time=5.0) == 0.0
+
+
+def test_vehicle_stopped_once_then_rides_the_wave():
+    # Stops at junction 0, leaves at 30 and reaches junction 1 at 35, when it turns green.
+    assert stops_per_vehicle([GREENS, GREENS + 5], [15.0], travel_time=5.0) == 1.0
+
+
+def test_vehicle_stops_at_every_misaligned_junction():
+    assert stops_per_vehicle([GREENS, GREENS + 20], [5.0], travel_time=5.0) == 1.0
+    assert stops_per_vehicle([GREENS, GREENS + 20, GREENS + 40], [15.0], travel_time=5.0) == 3.0
+
+
+def test_slack_lets_vehicle_roll_into_green():
+    assert stops_per_vehicle([GREENS], [29.5], travel_time=5.0) == 0.0
+    assert stops_per_vehicle([GREENS], [28.0], travel_time=5.0) == 1.0
+    # Rolling in at 29.5 still leaves at the green onset, so the next junction is on time.
+    assert stops_per_vehicle([GREENS, GREENS + 5], [29.5], travel_time=5.0) == 0.0
+
+
+def test_stops_are_averaged_over_vehicles():
+    arrivals = np.arange(0, 30, 1.0)
+    assert stops_per_vehicle([GREENS, GREENS + 5], arrivals, travel_time=5.0) == pytest.approx(19 / 30) # 10-28 stop once; 29 rolls in
+
+
+def test_vehicles_past_the_timeline_are_excluded():
+    assert stops_per_vehicle([GREENS], [5.0, 75.0], travel_time=5.0) == 0.0
+    assert stops_per_vehicle([GREENS], [75.0], travel_time=5.0) is None
+    assert stops_per_vehicle([GREENS, np.empty((0, 2))], [5.0], travel_time=5.0) is None
+
+
+def test_leader_keeps_its_cycle(plan):
+    link = make_link(plan, now=1000.0, epoch=None, upstream=None)
+    assert link.next_cycle_start() == 1030.0
+    assert link.last_error is None
+
+
+def test_small_error_is_corrected_by_gain(plan):
+    # Junction 1 wants its cycle at epoch + 8; it is 1s behind.
+    link = make_link(plan, now=1000.0, epoch=993.0)
+    assert link.next_cycle_start() == pytest.approx(1030.5)
+    assert link.last_error == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize('shift, error, step', [
+    (14.0, 14.0, 2.0),    # Just under half a cycle ahead: clamped to +max_step
+    (16.0, -14.0, -2.0),  # Just over half a cycle wraps to a negative error
+    (-16.0, 14.0, 2.0),
+    (-14.0, -14.0, -2.0),
+    (30.0, 0.0, 0.0),     # Whole cycles apart is already aligned
+])
+def test_error_wraps_at_half_cycle_and_step_is_clamped(plan, shift, error, step):
+    link = make_link(plan, now=1000.0, epoch=1000.0 - 8.0 + shift)
+    assert link.next_cycle_start() == pytest.approx(1030.0 + step)
+    assert link.last_error == pytest.approx(error)
+
+
+def test_overrun_skips_ahead_whole_cycles(plan):
+    link = make_link(plan, now=1040.0, epoch=None, upstream=None)
+    assert link.next_cycle_start() == 1060.0
+
+
+def test_first_cycle_joins_upstream_wave(plan):
+    link = make_link(plan, now=1000.0, epoch=990.0, cycle_start=None)
+    # Wave position 998 (+30k); the first that leaves time to switch in is 1028.
+    assert link.next_cycle_start() == pytest.approx(1028.0)
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pytest
+from signal_history import (SignalHistory, EventRing, TRANSITION_DTYPE,
+                            RED, OFF, YELLOW, GREEN, PROCESSED, DROPPED)
+
+HOUR = 3600
+
+
+@pytest.fixture
+def history(tmp_path):
+    return SignalHistory(str(tmp_path), capacity=16, file_span=HOUR)
+
+
+def set_all(history, ts, states):
+    for road_id, state in states.items():
+        history.record_transition(road_id, state, ts=ts)
+
+
+def test_ring_returns_unspilled_rows_in_order():
+    ring = EventRing(TRANSITION_DTYPE, 4)
+    for i in range(6):
+        if ring.pending() == 4:
+            ring.mark_spilled(2)
+        ring.append((float(i), 1, RED))
+    assert ring.unspilled()['ts'].tolist() == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_ring_overflow_spills_instead_of_overwriting(history, tmp_path):
+    for i in range(40):
+        history.record_transition(1, GREEN if i % 2 else RED, ts=100.0 + i)
+    assert os.listdir(tmp_path) == ['transitions_0.npz']
+    assert history.switch_counts(0, 200)[1] == 20
+
+
+def test_spills_append_to_hourly_files(history, tmp_path):
+    history.record_transition(1, GREEN, ts=10)
+    history.spill()
+    history.record_transition(1, RED, ts=20)
+    history.record_transition(1, GREEN, ts=HOUR + 10)
+    history.spill()
+    assert sorted(os.listdir(tmp_path)) == ['transitions_0.npz', f'transitions_{HOUR}.npz']
+    assert history.switch_counts(0, 2 * HOUR)[1] == 2
+
+
+def test_window_crossing_spill_files(history):
+    set_all(history, 0, {1: GREEN, 2: GREEN, 3: RED, 4: RED})
+    history.spill()
+    set_all(history, HOUR, {1: RED, 2: RED, 3: GREEN, 4: GREEN})
+    history.spill()
+    set_all(history, 2 * HOUR, {1: GREEN, 2: GREEN, 3: RED, 4: RED}) # Still in memory
+
+    share = history.green_share(HOUR - 900, 2 * HOUR + 900)
+    assert share[1] == pytest.approx(1800 / 5400)
+    assert share[3] == pytest.approx(3600 / 5400)
+    assert history.switch_counts(HOUR - 900, 2 * HOUR + 900) == {1: 1, 2: 1, 3: 1, 4: 1}
+
+
+def test_state_at_window_start_comes_from_older_files(history):
+    set_all(history, 90, {1: RED, 2: RED, 4: RED})
+    history.record_transition(3, GREEN, ts=100)
+    history.spill()
+    for ts in range(HOUR, HOUR + 10):
+        history.record_transition(1, OFF if ts % 2 else RED, ts=ts)
+    history.spill()
+
+    share = history.green_share(2 * HOUR, 2 * HOUR + 100)
+    assert share[3] == pytest.approx(1.0)
+    assert history.green_intervals(3, 2 * HOUR, 2 * HOUR + 100).tolist() == [[2 * HOUR, 2 * HOUR + 100]]
+
+
+def test_blink_stats(history):
+    set_all(history, 0, {1: YELLOW, 2: YELLOW, 3: RED, 4: RED})
+    for ts in (1, 2, 3, 4):
+        set_all(history, ts, {3: OFF if ts % 2 else RED, 4: OFF if ts % 2 else RED})
+    stats = history.blink_stats(0, 10)
+    assert stats[3] == {'pulses': 2, 'off_seconds': 2.0}
+    assert stats[1] == {'pulses': 0, 'off_seconds': 0.0}
+
+
+def test_wait_percentiles(history):
+    for i, wait in enumerate([1.0, 2.0, 3.0, 4.0]):
+        history.record_request(1, PROCESSED, wait=wait, ts=100 + i)
+    history.record_request(2, DROPPED, ts=101)
+    result = history.wait_percentiles(0, 200, percentiles=(50,))
+    assert result == {'count': 4, 'p50': 2.5}
+
+
+def test_wait_percentiles_empty_window(history):
+    history.record_request(1, PROCESSED, wait=1.0, ts=100)
+    assert history.wait_percentiles(200, 300) == {'count': 0, 'p50': None, 'p90': None, 'p99': None}
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+# Tracing is opt-in: set TRAFFIC_TRACE=1 in the environment to record spans.
+TRACE_ENV_VAR = 'TRAFFIC_TRACE'
+# A trace file is rotated to <path>.1 once it grows past this size.
+MAX_TRACE_BYTES = 50 * 1024 * 1024
+
+
+def new_trace_id():
+    """Generates a short random trace id to carry across RPC calls."""
+    return uuid.uuid4().hex[:16]
+
+
+class Tracer:
+    """Writes timed spans to a file in the Chrome Trace Event format.
+
+    The file is a JSON array that is never closed, which the format allows,
+    so it can be appended to while the process runs and loaded as-is into
+    chrome://tracing or https://ui.perfetto.dev. Restarts append to the
+    existing file; once it passes max_bytes it is moved to <path>.1 and a
+    new file is started.
+    """
+    def __init__(self, path, process_name=None, max_bytes=MAX_TRACE_BYTES):
+        self.path = path
+        self.process_name = process_name
+        self.max_bytes = max_bytes
+        self.pid = os.getpid()
+        self.write_lock = threading.Lock()
+        self.file = None
+        if path is None or os.environ.get(TRACE_ENV_VAR) != '1':
+            return # Tracing disabled
+
+        with self.write_lock:
+            self._open()
+
+    def _open(self):
+        """Opens the trace file for appending. Caller must hold write_lock."""
+        self.file = open(self.path, 'a')
+        if self.file.tell() == 0:
+            self.file.write("[\n")
+        if self.process_name:
+            self.file.write(json.dumps({'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                                        'args': {'name': self.process_name}}) + ",\n")
+
+    def _write(self, event):
+        with self.write_lock:
+            if self.file is None:
+                return # Closed while another thread was still tracing
+            self.file.write(json.dumps(event) + ",\n")
+            self.file.flush()
+            if self.file.tell() >= self.max_bytes:
+                self.file.close()
+                os.replace(self.path, self.path + '.1')
+                self._open()
+
+    @contextmanager
+    def span(self, name, trace_id=None, **args):
+        """Records the wall time of the enclosed block as a complete ('X') event."""
+        if self.file is None:
+            yield
+            return
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.time(), trace_id, **args)
+
+    def record(self, name, start, end, trace_id=None, **args):
+        """Records a span whose start and end times were measured elsewhere."""
+        if self.file is None:
+            return
+        if trace_id is not None:
+            args['trace_id'] = trace_id
+        self._write({
+            'name': name,
+            'ph': 'X',
+            'ts': int(start * 1e6),
+            'dur': int((end - start) * 1e6),
+            'pid': self.pid,
+            'tid': threading.get_ident(),
+            'args': args
+        })
+
+    def close(self):
+        if self.file is not None:
+            with self.write_lock:
+                self.file.close()
+                self.file = None
+
+
+class SamplingProfiler:
+    """Periodically samples the stacks of all threads in this process.
+
+    Stacks are aggregated in the collapsed ("folded") format used by
+    flamegraph.pl and speedscope: one 'frame;frame;frame count' line per stack.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return False
+        self.samples.clear()
+        self.running = True
+        self.thread = threading.Thread(target=self._sample_loop, name="Profiler", daemon=True)
+        self.thread.start()
+        logging.info(f"Sampling profiler started (interval={self.interval}s).")
+        return True
+
+    def stop(self, output_path):
+        """Stops sampling and writes the collapsed stacks. Returns the sample count."""
+        if not self.running:
+            return 0
+        self.running = False
+        self.thread.join()
+
+        with open(output_path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        total = sum(self.samples.values())
+        logging.info(f"Sampling profiler stopped. {total} samples written to {output_path}.")
+        return total
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while self.running:
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
@@ -5,6 +5,10 @@ import threading
 import time
 import sys
 from datetime import datetime
+from rpyc.utils.classic import obtain
+from tracing import Tracer, new_trace_id
+
+TRACE_FILE = 'traffic_display_trace.json' # Chrome Trace Event format; None disables tracing
 
 class TrafficSignalDisplay:
     def __init__(self, server_host='localhost', server_port=18812):
@@ -19,6 +23,7 @@ class TrafficSignalDisplay:
         self.signal_objects = {}
         self.status_label = None
         self.connected = False
+        self.tracer = Tracer(TRACE_FILE, process_name="TrafficDisplay")
         
     def connect_to_server(self):
         try:
@@ -42,11 +47,15 @@ class TrafficSignalDisplay:
     def update_from_server(self):
         while self.running and self.connected:
             try:
-                state_data = self.connection.root.get_signal_state()
-                self.signals = state_data['signals']
+                trace_id = new_trace_id()
+                with self.tracer.span("client.get_signal_state", trace_id):
+                    state_data = self.connection.root.get_signal_state(trace_id=trace_id)
+                # Copy the netref so rendering does not make remote calls.
+                with self.tracer.span("client.obtain", trace_id):
+                    self.signals = obtain(state_data['signals'])
                 self.last_update = datetime.now()
                 if self.root:
-                    self.root.after(0, self.update_display)
+                    self.root.after(0, self.update_display, trace_id)
                 time.sleep(0.5)
             except Exception as e:
                 print(f"Update error: {e}")
@@ -116,9 +125,13 @@ class TrafficSignalDisplay:
             self.signal_objects[road_id] = {'red': red_light, 'yellow': yellow_light, 'green': green_light}
             self.canvas.create_text(x+17, y-15, text=f"#{road_id}", fill='white', font=('Arial', 10, 'bold'))
     
-    def update_display(self):
+    def update_display(self, trace_id=None):
         if not self.canvas or not self.signal_objects:
             return
+        with self.tracer.span("client.render", trace_id):
+            self._render_signals()
+
+    def _render_signals(self):
         colors = {
             0: {'red': 'red', 'yellow': 'darkorange', 'green': 'darkgreen'},
             0.5: {'red': '#300', 'yellow': 'darkorange', 'green': 'darkgreen'},
@@ -153,6 +166,7 @@ class TrafficSignalDisplay:
                 self.connection.close()
             except:
                 pass
+        self.tracer.close()
         self.root.destroy()
 
 def main():